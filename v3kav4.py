@@ -1,15 +1,15 @@
 import os
 import re
+import zipfile
 from multiprocessing import Pool, cpu_count
-from docx import Document
-from docx.shared import RGBColor
+from xml.sax.saxutils import escape
 from tqdm import tqdm
 
 # --- CONFIGURATION ---
 INPUT_FILE = "input.txt"
 OUTPUT_DIR = "output"
 CHUNK_SIZE = 1000
-SAVE_BATCH_SIZE = 100
+MAX_DOCX_MB = None       # split a category into <category>_2.docx, ... past this size; None = no cap
 
 # --- PII REGEX PATTERNS ---
 pii_patterns = {
@@ -83,39 +83,141 @@ def merge_results(partials):
             merged[k].extend(v)
     return merged
 
-# --- SAVE INDIVIDUAL DOCX FILE ---
-def save_docx_batch(category, batch_index, items):
+# --- MINIMAL DOCX PACKAGE PARTS ---
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+DOCUMENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+).encode("utf-8")
+DOCUMENT_TAIL = b'<w:sectPr/></w:body></w:document>'
+
+# Characters not allowed in XML 1.0 (python-docx would reject these too)
+invalid_xml_chars = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+def xml_text(text):
+    return escape(invalid_xml_chars.sub("", text))
+
+def plain_run(text):
+    return f'<w:r><w:t xml:space="preserve">{xml_text(text)}</w:t></w:r>'
+
+def red_run(text):
+    return (f'<w:r><w:rPr><w:color w:val="FF0000"/></w:rPr>'
+            f'<w:t xml:space="preserve">{xml_text(text)}</w:t></w:r>')
+
+def paragraph_xml(line_num, text, span, match_text):
+    runs = [plain_run(f"Line {line_num}: ")]
+    if span:
+        start, end = span
+        runs.append(plain_run(text[:start]))
+        runs.append(red_run(match_text))
+        runs.append(plain_run(text[end:]))
+    else:
+        runs.append(red_run(text))
+    return ("<w:p>" + "".join(runs) + "</w:p>").encode("utf-8")
+
+# --- STREAMING DOCX WRITER ---
+# Room left for what is still buffered in the compressor plus the zip central directory
+DOCX_TAIL_ALLOWANCE = 64 * 1024
+# Roll over before document.xml needs ZIP64, which Office readers rarely see
+MAX_DOCUMENT_XML_BYTES = zipfile.ZIP64_LIMIT - len(DOCUMENT_TAIL)
+
+def open_docx(filename):
+    zf = zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED)
+    zf.writestr("[Content_Types].xml", CONTENT_TYPES_XML)
+    zf.writestr("_rels/.rels", RELS_XML)
+    body = zf.open("word/document.xml", "w")
+    body.write(DOCUMENT_HEAD)
+    return zf, body
+
+def close_docx(zf, body):
+    body.write(DOCUMENT_TAIL)
+    body.close()
+    zf.close()
+
+def discard_docx(zf, body, filename):
+    try:
+        body.close()
+        zf.close()
+    finally:
+        os.remove(filename)
+
+def docx_part_name(folder, category, part):
+    suffix = "" if part == 1 else f"_{part}"
+    return os.path.join(folder, f"{category}{suffix}.docx")
+
+def remove_stale_parts(folder, category, parts):
+    # Drop <category>_N.docx left behind by earlier runs that split into more files
+    keep = {os.path.basename(docx_part_name(folder, category, n)) for n in range(1, parts + 1)}
+    stale = re.compile(re.escape(category) + r"(?:_\d+)?\.docx")
+    for name in os.listdir(folder):
+        if stale.fullmatch(name) and name not in keep:
+            os.remove(os.path.join(folder, name))
+
+# --- SAVE ONE DOCX PER CATEGORY ---
+def save_category_docx(args):
+    category, items = args
     folder = os.path.join(OUTPUT_DIR, category)
     os.makedirs(folder, exist_ok=True)
-    filename = os.path.join(folder, f"{category}_{batch_index + 1}.docx")
-
-    doc = Document()
-    for line_num, text, span, match_text in items:
-        para = doc.add_paragraph(f"Line {line_num}: ")
-        if span:
-            start, end = span
-            para.add_run(text[:start])
-            match = para.add_run(match_text)
-            match.font.color.rgb = RGBColor(255, 0, 0)
-            para.add_run(text[end:])
-        else:
-            match = para.add_run(text)
-            match.font.color.rgb = RGBColor(255, 0, 0)
-    doc.save(filename)
-
-# --- SAVE RESULTS SEQUENTIALLY ---
-def save_results(results):
+    # Cap is checked against the zipped bytes already on disk, so files land close to (not exactly at) it
+    max_bytes = MAX_DOCX_MB * 1024 * 1024 if MAX_DOCX_MB else None
+
+    # Each part is written to a .tmp file and only renamed into place once complete
+    part = 1
+    filename = docx_part_name(folder, category, part)
+    zf, body = open_docx(filename + ".tmp")
+    try:
+        xml_bytes = len(DOCUMENT_HEAD)
+        empty = True
+        for item in items:
+            para = paragraph_xml(*item)
+            too_big = xml_bytes + len(para) > MAX_DOCUMENT_XML_BYTES or (
+                max_bytes and zf.fp.tell() + len(para) + DOCX_TAIL_ALLOWANCE > max_bytes)
+            if too_big and not empty:
+                close_docx(zf, body)
+                os.replace(filename + ".tmp", filename)
+                part += 1
+                filename = docx_part_name(folder, category, part)
+                zf, body = open_docx(filename + ".tmp")
+                xml_bytes = len(DOCUMENT_HEAD)
+            body.write(para)
+            xml_bytes += len(para)
+            empty = False
+        close_docx(zf, body)
+    except BaseException:
+        discard_docx(zf, body, filename + ".tmp")
+        raise
+    os.replace(filename + ".tmp", filename)
+    remove_stale_parts(folder, category, part)
+    return category, part
+
+# --- SAVE RESULTS IN PARALLEL ---
+def save_results(results, pool):
     print("\n📝 Saving Word files...")
-    jobs = []
-    for category, items in results.items():
-        if not items:
-            continue
-        for i in range(0, len(items), SAVE_BATCH_SIZE):
-            batch = items[i:i + SAVE_BATCH_SIZE]
-            jobs.append((category, i // SAVE_BATCH_SIZE, batch))
+    jobs = [(category, items) for category, items in results.items() if items]
+    # Biggest categories first so they don't end up as the last straggler
+    jobs.sort(key=lambda job: len(job[1]), reverse=True)
 
-    for args in tqdm(jobs, desc="📄 Saving DOCX Files", unit="file"):
-        save_docx_batch(*args)
+    file_counts = {}
+    for category, parts in tqdm(pool.imap_unordered(save_category_docx, jobs),
+                                total=len(jobs), desc="📄 Saving DOCX Files", unit="category"):
+        file_counts[category] = parts
+    return file_counts
 
 # --- MAIN EXECUTION ---
 def main():
@@ -133,12 +235,12 @@ def main():
             unit="chunk"
         ))
 
-    final_results = merge_results(partials)
-    save_results(final_results)
+        final_results = merge_results(partials)
+        file_counts = save_results(final_results, pool)
 
     print("\n📊 PII Scan Summary:")
     for k, v in final_results.items():
-        print(f"- {k}: {len(v)} matches")
+        print(f"- {k}: {len(v)} matches in {file_counts.get(k, 0)} file(s)")
     print(f"\n✅ Done! Files saved in '{OUTPUT_DIR}/<PII>/' folders.")
 
 if __name__ == "__main__":